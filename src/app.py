@@ -1,17 +1,39 @@
 # src/app.py
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request
+from flask.json.provider import JSONProvider
+import itertools
 import os
 import logging
 from services.payment_gateway import PaymentGateway, PaymentError
 from services.email_service import EmailService, EmailError
 from services.payment_processor import PaymentProcessor
 
+try:
+    import orjson
+except ImportError:  # orjson - опциональная зависимость
+    orjson = None
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config['JSON_AS_ASCII'] = False  # Для корректного отображения кириллицы
+# Каталог static лежит в корне проекта, а не рядом с app.py
+app = Flask(__name__, static_folder='../static')
+
+if orjson is not None:
+    class ORJSONProvider(JSONProvider):
+        """JSON-провайдер на базе orjson: C-сериализация вместо stdlib"""
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = ORJSONProvider(app)
+else:
+    # Для корректного отображения кириллицы без orjson
+    app.json.ensure_ascii = False
 
 # Инициализация сервисов
 payment_gateway = PaymentGateway()
@@ -22,7 +44,11 @@ payment_processor = PaymentProcessor(payment_gateway, email_service)
 @app.route('/')
 def index():
     """Главная страница"""
-    return render_template('index.html')
+    # index.html не содержит Jinja-подстановок - отдаем как статику,
+    # чтобы браузер мог закэшировать страницу
+    response = app.send_static_file('index.html')
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
 
 
 @app.route('/api/health', methods=['GET'])
@@ -49,16 +75,25 @@ def create_payment():
                     "error": f"Обязательное поле '{field}' отсутствует"
                 }), 400
 
-        amount = float(data['amount'])
+        # JSON уже распарсил число - не перегоняем через float() строки
+        raw_amount = data['amount']
+        if isinstance(raw_amount, bool) or not isinstance(raw_amount, (int, float)):
+            return jsonify({"error": "Поле 'amount' должно быть числом"}), 400
+        amount = float(raw_amount)
         card_token = data['card_token']
         user_email = data['user_email']
         description = data.get('description', '')
 
         # Выполнение платежа
-        result = payment_processor.make_payment(amount, card_token, user_email, description)
+        result = payment_processor.make_payment(
+            amount=amount,
+            card_token=card_token,
+            user_email=user_email,
+            description=description
+        )
 
         if result['success']:
-            logger.info(f"Payment successful: {result['transaction_id']}")
+            logger.info("Payment successful: %s", result['transaction_id'])
             return jsonify({
                 "success": True,
                 "data": result,
@@ -71,13 +106,13 @@ def create_payment():
             }), 400
 
     except ValueError as e:
-        logger.warning(f"Validation error: {e}")
+        logger.warning("Validation error: %s", e)
         return jsonify({"error": str(e)}), 400
     except PaymentError as e:
-        logger.error(f"Payment error: {e}")
+        logger.error("Payment error: %s", e)
         return jsonify({"error": str(e)}), 502
     except Exception as e:
-        logger.error(f"Internal server error: {e}")
+        logger.error("Internal server error: %s", e)
         return jsonify({"error": "Внутренняя ошибка сервера"}), 500
 
 
@@ -112,11 +147,6 @@ def get_payment_history():
     """Получение истории платежей"""
     user_email = request.args.get('user_email')
 
-    if user_email:
-        transactions = payment_processor.get_user_transactions(user_email)
-    else:
-        transactions = payment_processor.transactions
-
     # Пагинация
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
@@ -124,7 +154,10 @@ def get_payment_history():
     start_idx = (page - 1) * per_page
     end_idx = start_idx + per_page
 
-    paginated_transactions = transactions[start_idx:end_idx]
+    # Итератор + islice: в память попадает только запрошенная страница
+    total = payment_processor.count(user_email)
+    paginated_transactions = list(itertools.islice(
+        payment_processor.iter_transactions(user_email), start_idx, end_idx))
 
     return jsonify({
         "success": True,
@@ -133,8 +166,8 @@ def get_payment_history():
             "pagination": {
                 "page": page,
                 "per_page": per_page,
-                "total": len(transactions),
-                "total_pages": (len(transactions) + per_page - 1) // per_page
+                "total": total,
+                "total_pages": (total + per_page - 1) // per_page
             }
         }
     })
@@ -159,7 +192,7 @@ def validate_card():
             }
         })
     except Exception as e:
-        logger.error(f"Card validation error: {e}")
+        logger.error("Card validation error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
@@ -177,5 +210,8 @@ def method_not_allowed(error):
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
-    debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
-    app.run(host='localhost', port=port, debug=debug)
\ No newline at end of file
+    # Отладчик и reloader оборачивают каждый запрос - включаем их
+    # только при явном FLASK_ENV=development
+    debug = os.getenv('FLASK_ENV') == 'development'
+    # threaded=True, чтобы параллельные запросы не ждали друг друга на I/O
+    app.run(host='localhost', port=port, debug=debug, threaded=True)
\ No newline at end of file
@@ -0,0 +1,17 @@
+# src/asgi.py
+"""ASGI-точка входа для запуска под uvicorn/hypercorn.
+
+Dev-сервер Werkzeug обрабатывает запросы по одному, поэтому блокирующие
+вызовы платежного шлюза и SMTP сериализуют всех клиентов. Обертка
+WsgiToAsgi выполняет обработчики в пуле потоков ASGI-сервера, так что
+запросы, ожидающие сетевой I/O, не блокируют друг друга.
+
+Запуск (из каталога src):
+    hypercorn --workers 4 asgi:application
+    uvicorn --workers 4 asgi:application
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+application = WsgiToAsgi(app)
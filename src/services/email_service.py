@@ -1,6 +1,8 @@
 # src/services/email_service.py
 from typing import Dict
 import smtplib
+import string
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
@@ -8,6 +10,21 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Шаблон чека компилируется один раз на модуль, а не на каждое письмо
+_RECEIPT_TEMPLATE = string.Template("""
+        <html>
+        <body>
+            <h2>Квитанция об оплате</h2>
+            <p><strong>ID транзакции:</strong> $transaction_id</p>
+            <p><strong>Сумма:</strong> $amount руб.</p>
+            <p><strong>Статус:</strong> Успешно оплачено</p>
+            <p>Спасибо за оплату!</p>
+            <hr>
+            <p><small>Это автоматическое письмо, пожалуйста, не отвечайте на него.</small></p>
+        </body>
+        </html>
+        """)
+
 
 class EmailError(Exception):
     """Исключение для ошибок отправки email"""
@@ -24,6 +41,29 @@ class EmailService:
         self.smtp_user = smtp_user or os.getenv('SMTP_USER', '')
         self.smtp_password = smtp_password or os.getenv('SMTP_PASSWORD', '')
         self.use_tls = os.getenv('SMTP_USE_TLS', 'True').lower() == 'true'
+        # Долгоживущее SMTP-соединение: TCP + STARTTLS + AUTH выполняются
+        # один раз, а не перед каждым письмом
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+
+    def _get_connection(self) -> smtplib.SMTP:
+        """Получение закэшированного SMTP-соединения (создает при первом вызове)"""
+        if self._smtp is None:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            if self.use_tls:
+                server.starttls()
+            server.login(self.smtp_user, self.smtp_password)
+            self._smtp = server
+        return self._smtp
+
+    def _close_connection(self):
+        """Закрытие закэшированного SMTP-соединения"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
 
     def send_receipt(self, email: str, amount: float, transaction_id: str) -> bool:
         """Отправка чека на email"""
@@ -33,30 +73,27 @@ class EmailService:
         try:
             return self._send_email(email, subject, body)
         except Exception as e:
-            logger.error(f"Ошибка отправки email: {e}")
+            logger.error("Ошибка отправки email: %s", e)
             raise EmailError(f"Не удалось отправить email: {str(e)}")
 
+    @staticmethod
+    def _receipt_fields(amount: float, transaction_id: str) -> Dict:
+        """Поля чека в том виде, в котором они подставляются в шаблон"""
+        return {
+            "transaction_id": transaction_id,
+            "amount": f"{amount:.2f}"
+        }
+
     def _create_receipt_body(self, amount: float, transaction_id: str) -> str:
         """Создание тела письма с чеком"""
-        return f"""
-        <html>
-        <body>
-            <h2>Квитанция об оплате</h2>
-            <p><strong>ID транзакции:</strong> {transaction_id}</p>
-            <p><strong>Сумма:</strong> {amount:.2f} руб.</p>
-            <p><strong>Статус:</strong> Успешно оплачено</p>
-            <p>Спасибо за оплату!</p>
-            <hr>
-            <p><small>Это автоматическое письмо, пожалуйста, не отвечайте на него.</small></p>
-        </body>
-        </html>
-        """
+        return _RECEIPT_TEMPLATE.substitute(
+            self._receipt_fields(amount, transaction_id))
 
     def _send_email(self, to_email: str, subject: str, body: str) -> bool:
         """Отправка email через SMTP"""
         if not self.smtp_user or not self.smtp_password:
             logger.warning("SMTP credentials not set. Email will be logged instead.")
-            logger.info(f"Would send email to {to_email}: {subject}")
+            logger.info("Would send email to %s: %s", to_email, subject)
             return True
 
         msg = MIMEMultipart('alternative')
@@ -68,16 +105,22 @@ class EmailService:
         msg.attach(html_part)
 
         try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                if self.use_tls:
-                    server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
-                server.send_message(msg)
+            with self._smtp_lock:
+                server = self._get_connection()
+                try:
+                    server.send_message(msg)
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+                    # Соединение протухло - переоткрываем и пробуем еще раз
+                    self._close_connection()
+                    server = self._get_connection()
+                    server.send_message(msg)
 
-            logger.info(f"Email sent successfully to {to_email}")
+            logger.info("Email sent successfully to %s", to_email)
             return True
         except Exception as e:
-            logger.error(f"Failed to send email: {e}")
+            logger.error("Failed to send email: %s", e)
+            with self._smtp_lock:
+                self._close_connection()
             return False
 
     def send_notification(self, email: str, subject: str, message: str) -> bool:
@@ -1,7 +1,38 @@
 # src/services/payment_gateway.py
 import requests
-from typing import Dict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+import logging
 import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # redis - опциональная зависимость
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Время жизни кэша результатов валидации карт (секунды)
+CARD_CACHE_TTL = 300
+
+# Максимальный размер внутрипроцессного кэша валидации карт
+LOCAL_CARD_CACHE_SIZE = 4096
+
+# Удвоенные цифры для алгоритма Луна (с заранее вычтенной девяткой)
+_LUHN_DOUBLE = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+
+def _luhn_valid(pan: str) -> bool:
+    """Проверка контрольной цифры номера карты по алгоритму Луна"""
+    total = 0
+    for i, ch in enumerate(reversed(pan)):
+        digit = ord(ch) - 48
+        total += digit if i % 2 == 0 else _LUHN_DOUBLE[digit]
+    return total % 10 == 0
 
 
 class PaymentError(Exception):
@@ -12,14 +43,58 @@ class PaymentError(Exception):
 class PaymentGateway:
     """Класс для работы с внешним платежным шлюзом"""
 
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache_client=None):
         self.api_key = api_key or os.getenv('PAYMENT_API_KEY', 'test_key_123')
         self.base_url = os.getenv('PAYMENT_API_URL', "https://api.payment-gateway.com")
+        # Опциональный Redis-кэш результатов валидации карт: повторные
+        # проверки одного токена не ходят по HTTPS
+        self.cache = cache_client or self._connect_cache()
+        # Постоянная сессия с пулом соединений: TCP+TLS handshake
+        # выполняется один раз, а не на каждый запрос к шлюзу
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=2, backoff_factor=0.1,
+                              status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Внутрипроцессный TTL-кэш валидации карт: работает и без Redis
+        self._local_cache = {}
+        self._local_cache_lock = threading.Lock()
+
+    def _local_cache_get(self, card_token: str):
+        """Чтение результата валидации из внутрипроцессного кэша"""
+        with self._local_cache_lock:
+            entry = self._local_cache.get(card_token)
+            if entry is None:
+                return None
+            expires_at, valid = entry
+            if expires_at < time.monotonic():
+                del self._local_cache[card_token]
+                return None
+            return valid
+
+    def _local_cache_set(self, card_token: str, valid: bool):
+        """Запись результата валидации во внутрипроцессный кэш"""
+        with self._local_cache_lock:
+            if len(self._local_cache) >= LOCAL_CARD_CACHE_SIZE:
+                self._local_cache.clear()
+            self._local_cache[card_token] = (time.monotonic() + CARD_CACHE_TTL, valid)
+
+    @staticmethod
+    def _connect_cache():
+        """Подключение к Redis-кэшу, если задан REDIS_URL"""
+        redis_url = os.getenv('REDIS_URL')
+        if not redis_url or redis is None:
+            return None
+        return redis.Redis.from_url(redis_url, decode_responses=True)
 
     def process_payment(self, amount: float, card_token: str) -> Dict:
         """Обработка платежа через внешний API"""
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/payments",
                 json={
                     "amount": amount,
@@ -48,13 +123,62 @@ class PaymentGateway:
 
     def validate_card(self, card_token: str) -> bool:
         """Валидация карты"""
+        # Сырые 16-значные PAN с неверной контрольной цифрой отсекаем
+        # локально - без похода по HTTPS. isascii() обязателен: isdigit()
+        # пропускает не-ASCII цифры, на которых алгоритм Луна не определен
+        if isinstance(card_token, str) and len(card_token) == 16 \
+                and card_token.isascii() and card_token.isdigit() \
+                and not _luhn_valid(card_token):
+            return False
+
+        local_cached = self._local_cache_get(card_token)
+        if local_cached is not None:
+            return local_cached
+
+        cache_key = f"card_valid:{card_token}"
+        if self.cache is not None:
+            try:
+                cached = self.cache.get(cache_key)
+            except Exception as e:
+                logger.warning("Card cache unavailable: %s", e)
+                cached = None
+            if cached is not None:
+                valid = cached in ("1", b"1")
+                self._local_cache_set(card_token, valid)
+                return valid
+
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/cards/{card_token}/validate",
                 params={"api_key": self.api_key},
                 timeout=5
             )
             response.raise_for_status()
-            return response.json().get('valid', False)
+            valid = response.json().get('valid', False)
         except requests.exceptions.RequestException:
-            return False
\ No newline at end of file
+            # Ошибки сети не кэшируем - следующий вызов попробует снова
+            return False
+
+        self._local_cache_set(card_token, valid)
+        if self.cache is not None:
+            try:
+                self.cache.set(cache_key, "1" if valid else "0", ex=CARD_CACHE_TTL)
+            except Exception as e:
+                logger.warning("Failed to cache card validation: %s", e)
+        return valid
+
+    def validate_cards_bulk(self, card_tokens: Iterable[str]) -> Dict[str, bool]:
+        """Параллельная валидация набора карт.
+
+        N последовательных HTTP-вызовов схлопываются примерно до одного
+        RTT: проверки выполняются конкурентно через пул потоков поверх
+        общего пула соединений сессии.
+        """
+        # Уникальные токены с сохранением порядка
+        tokens = list(dict.fromkeys(card_tokens))
+        if not tokens:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(32, len(tokens))) as pool:
+            results = pool.map(self.validate_card, tokens)
+        return dict(zip(tokens, results))
\ No newline at end of file
@@ -1,20 +1,96 @@
 # src/services/payment_processor.py
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import json
 import logging
+import os
+import re
+import threading
+import time
 from .payment_gateway import PaymentGateway, PaymentError
 from .email_service import EmailService, EmailError
 
+try:
+    import redis
+except ImportError:  # redis - опциональная зависимость
+    redis = None
+
 logger = logging.getLogger(__name__)
 
+# Прекомпилированные регулярки валидации: одна C-проверка на вызов
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_]{10,}$")
+
 
 class PaymentProcessor:
     """Основной класс для обработки платежей"""
 
-    def __init__(self, payment_gateway: PaymentGateway, email_service: EmailService):
+    def __init__(self, payment_gateway: PaymentGateway, email_service: EmailService,
+                 redis_client: Optional[Any] = None):
         self.payment_gateway = payment_gateway
         self.email_service = email_service
         self.transactions: List[Dict] = []
+        # Индексы по ID и пользователю: O(1) поиск вместо прохода по списку
+        self._by_id: Dict[str, Dict] = {}
+        self._by_user: Dict[str, List[Dict]] = defaultdict(list)
+        # Защищает transactions при работе под многопоточным сервером
+        self._lock = threading.Lock()
+        # Скользящие агрегаты для get_transaction_stats: O(1) вместо
+        # прохода по всей истории на каждый запрос статистики
+        self._count_total = 0
+        self._count_success = 0
+        self._sum_amount = 0.0
+        # Опциональное Redis-хранилище: O(1) поиск по ID, общая история
+        # для нескольких воркеров и сохранность при рестарте
+        self.redis = redis_client or self._connect_redis()
+        # Чеки отправляются в фоне, чтобы HTTP-ответ не ждал SMTP
+        self._email_pool = ThreadPoolExecutor(max_workers=4,
+                                              thread_name_prefix="receipt")
+
+    @staticmethod
+    def _connect_redis() -> Optional[Any]:
+        """Подключение к Redis, если задан REDIS_URL"""
+        redis_url = os.getenv('REDIS_URL')
+        if not redis_url:
+            return None
+        if redis is None:
+            logger.warning("REDIS_URL задан, но пакет redis не установлен")
+            return None
+        return redis.Redis.from_url(redis_url, decode_responses=True)
+
+    def _store_transaction(self, transaction: Dict) -> None:
+        """Сохранение транзакции в памяти и (если настроено) в Redis"""
+        successful = transaction.get("status") == "success"
+        with self._lock:
+            self.transactions.append(transaction)
+            self._by_id[transaction["id"]] = transaction
+            self._by_user[transaction["user_email"]].append(transaction)
+            self._count_total += 1
+            self._sum_amount += transaction.get("amount", 0)
+            if successful:
+                self._count_success += 1
+
+        if self.redis is None:
+            return
+
+        transaction_id = transaction["id"]
+        try:
+            # Транзакция хранится как JSON, чтобы не терять типы значений
+            pipe = self.redis.pipeline()
+            pipe.set(f"txn:{transaction_id}", json.dumps(transaction))
+            pipe.zadd("txns_by_time", {transaction_id: time.time()})
+            # RPUSH: список пользователя хранится от старых к новым - в том
+            # же порядке, что _by_user и общий zset txns_by_time
+            pipe.rpush(f"user:{transaction['user_email']}:txns", transaction_id)
+            pipe.hincrby("stats", "total", 1)
+            pipe.hincrbyfloat("stats", "total_amount", transaction.get("amount", 0))
+            if successful:
+                pipe.hincrby("stats", "successful", 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to store transaction in Redis: %s", e)
 
     def make_payment(self, amount: float, card_token: str, user_email: str,
                      description: str = "") -> Dict:
@@ -25,48 +101,78 @@ class PaymentProcessor:
         try:
             # Обработка платежа через шлюз
             result = self.payment_gateway.process_payment(amount, card_token)
+            transaction_id = result.get("transaction_id")
+            status = result.get("status")
+            success = status == "success"
+            timestamp = datetime.now().isoformat()
 
             # Сохранение транзакции
             transaction = {
-                "id": result.get("transaction_id"),
+                "id": transaction_id,
                 "amount": amount,
-                "status": result.get("status"),
+                "status": status,
                 "user_email": user_email,
                 "description": description,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": timestamp,
                 "card_last_four": card_token[-4:] if len(card_token) >= 4 else "****"
             }
-            self.transactions.append(transaction)
-
-            # Отправка чека
-            if result.get("status") == "success":
-                try:
-                    self.email_service.send_receipt(
-                        email=user_email,
-                        amount=amount,
-                        transaction_id=result.get("transaction_id")
-                    )
-                    transaction["receipt_sent"] = True
-                except EmailError as e:
-                    logger.warning(f"Failed to send receipt: {e}")
-                    transaction["receipt_sent"] = False
-                    transaction["receipt_error"] = str(e)
+            # Отметки о чеке выставляются до сохранения, чтобы они попали
+            # и в Redis-копию транзакции, а не только в локальный словарь
+            if success:
+                transaction["receipt_queued"] = True
             else:
+                transaction["receipt_queued"] = False
                 transaction["receipt_sent"] = False
+            self._store_transaction(transaction)
+
+            # Отправка чека в фоне: ответ клиенту не ждет SMTP
+            if success:
+                self._email_pool.submit(
+                    self._send_receipt_task,
+                    transaction, user_email, amount, transaction_id
+                )
 
             return {
-                "success": result.get("status") == "success",
-                "transaction_id": result.get("transaction_id"),
+                "success": success,
+                "transaction_id": transaction_id,
                 "message": result.get("message", ""),
                 "amount": amount,
-                "timestamp": transaction["timestamp"]
+                "timestamp": timestamp
             }
 
         except PaymentError as e:
-            logger.error(f"Payment failed: {e}")
+            logger.error("Payment failed: %s", e)
             raise
 
-    def _validate_payment_data(self, amount: float, card_token: str, user_email: str):
+    def _persist_transaction(self, transaction: Dict) -> None:
+        """Обновление JSON-копии транзакции в Redis после мутации"""
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(f"txn:{transaction['id']}", json.dumps(transaction))
+        except Exception as e:
+            logger.warning("Failed to update transaction in Redis: %s", e)
+
+    def _send_receipt_task(self, transaction: Dict, user_email: str,
+                           amount: float, transaction_id: str) -> None:
+        """Фоновая отправка чека с отметкой результата в транзакции"""
+        try:
+            self.email_service.send_receipt(
+                email=user_email,
+                amount=amount,
+                transaction_id=transaction_id
+            )
+            transaction["receipt_sent"] = True
+        except EmailError as e:
+            logger.warning("Failed to send receipt: %s", e)
+            transaction["receipt_sent"] = False
+            transaction["receipt_error"] = str(e)
+        # Redis-копия обновляется после отправки: без этого воркеры,
+        # читающие через Redis, навсегда видели бы receipt_sent отсутствующим
+        self._persist_transaction(transaction)
+
+    def _validate_payment_data(self, amount: float, card_token: str,
+                               user_email: str) -> None:
         """Валидация данных платежа"""
         if amount <= 0:
             raise ValueError("Сумма платежа должна быть положительной")
@@ -77,15 +183,26 @@ class PaymentProcessor:
         if not card_token or not card_token.strip():
             raise ValueError("Токен карты не может быть пустым")
 
-        if len(card_token) < 10:
+        if not _TOKEN_RE.match(card_token):
             raise ValueError("Неверный формат токена карты")
 
-        if not user_email or "@" not in user_email:
+        if not user_email or not _EMAIL_RE.match(user_email):
             raise ValueError("Неверный формат email")
 
     def get_transaction_stats(self) -> Dict:
         """Получение статистики транзакций"""
-        if not self.transactions:
+        if self.redis is not None:
+            raw = self.redis.hgetall("stats") or {}
+            total = int(raw.get("total", 0))
+            successful = int(raw.get("successful", 0))
+            total_amount = float(raw.get("total_amount", 0))
+        else:
+            with self._lock:
+                total = self._count_total
+                successful = self._count_success
+                total_amount = self._sum_amount
+
+        if not total:
             return {
                 "total": 0,
                 "successful": 0,
@@ -95,33 +212,85 @@ class PaymentProcessor:
                 "average_amount": 0
             }
 
-        successful = [t for t in self.transactions if t.get("status") == "success"]
-        failed = [t for t in self.transactions if t.get("status") != "success"]
-
-        total_amount = sum(t.get("amount", 0) for t in self.transactions)
-        average_amount = total_amount / len(self.transactions) if self.transactions else 0
-
         return {
-            "total": len(self.transactions),
-            "successful": len(successful),
-            "failed": len(failed),
+            "total": total,
+            "successful": successful,
+            "failed": total - successful,
             "total_amount": total_amount,
-            "average_amount": round(average_amount, 2),
-            "success_rate": round((len(successful) / len(self.transactions)) * 100, 2)
+            "average_amount": round(total_amount / total, 2),
+            "success_rate": round((successful / total) * 100, 2)
         }
 
+    def count(self, user_email: Optional[str] = None) -> int:
+        """Число транзакций (всех или одного пользователя) за O(1)"""
+        if self.redis is not None:
+            if user_email:
+                return self.redis.llen(f"user:{user_email}:txns")
+            return self.redis.zcard("txns_by_time")
+
+        if user_email:
+            return len(self._by_user.get(user_email, ()))
+        return self._count_total
+
+    def iter_transactions(self, user_email: Optional[str] = None) -> Iterator[Dict]:
+        """Итератор по транзакциям без копирования всей истории"""
+        if self.redis is not None:
+            if user_email:
+                transaction_ids = self.redis.lrange(f"user:{user_email}:txns", 0, -1)
+            else:
+                transaction_ids = self.redis.zrange("txns_by_time", 0, -1)
+            for transaction_id in transaction_ids:
+                data = self.redis.get(f"txn:{transaction_id}")
+                if data:
+                    yield json.loads(data)
+            return
+
+        yield from (self._by_user.get(user_email, ()) if user_email
+                    else self.transactions)
+
     def get_transaction_by_id(self, transaction_id: str) -> Optional[Dict]:
         """Получение транзакции по ID"""
-        for transaction in self.transactions:
-            if transaction.get("id") == transaction_id:
-                return transaction
-        return None
+        if self.redis is not None:
+            data = self.redis.get(f"txn:{transaction_id}")
+            return json.loads(data) if data else None
+
+        return self._by_id.get(transaction_id)
 
     def get_user_transactions(self, user_email: str) -> List[Dict]:
         """Получение транзакций пользователя"""
-        return [t for t in self.transactions if t.get("user_email") == user_email]
+        if self.redis is not None:
+            transaction_ids = self.redis.lrange(f"user:{user_email}:txns", 0, -1)
+            if not transaction_ids:
+                return []
+            pipe = self.redis.pipeline()
+            for transaction_id in transaction_ids:
+                pipe.get(f"txn:{transaction_id}")
+            return [json.loads(data) for data in pipe.execute() if data]
+
+        return list(self._by_user.get(user_email, ()))
 
-    def clear_transactions(self):
+    def clear_transactions(self) -> None:
         """Очистка истории транзакций"""
-        self.transactions.clear()
+        with self._lock:
+            self.transactions.clear()
+            self._by_id.clear()
+            self._by_user.clear()
+            self._count_total = 0
+            self._count_success = 0
+            self._sum_amount = 0.0
+        if self.redis is not None:
+            transaction_ids = self.redis.zrange("txns_by_time", 0, -1)
+            keys = ["txns_by_time", "stats"]
+            if transaction_ids:
+                # user_email восстанавливается из JSON-копий, чтобы удалить
+                # и пользовательские списки - иначе llen после очистки
+                # продолжал бы отдавать старые счетчики
+                pipe = self.redis.pipeline()
+                for transaction_id in transaction_ids:
+                    pipe.get(f"txn:{transaction_id}")
+                user_emails = {json.loads(data)["user_email"]
+                               for data in pipe.execute() if data}
+                keys.extend(f"txn:{tid}" for tid in transaction_ids)
+                keys.extend(f"user:{email}:txns" for email in user_emails)
+            self.redis.delete(*keys)
         logger.info("Transaction history cleared")
\ No newline at end of file
@@ -0,0 +1,9 @@
+# src/wsgi.py
+"""WSGI-точка входа для gunicorn.
+
+Запуск (из каталога src):
+    gunicorn -w 4 --threads 16 --worker-class gthread wsgi:application
+"""
+from app import app
+
+application = app
@@ -0,0 +1,191 @@
+# tests/conftest.py
+import copy
+import pytest
+import sys
+import os
+import types
+import requests
+from unittest.mock import Mock, MagicMock, create_autospec, patch
+from flask import Flask
+
+# Добавляем корень проекта и src в путь для импорта
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import src.app
+from src.app import app as flask_app
+from src.services.payment_gateway import PaymentGateway
+from src.services.email_service import EmailService
+from src.services.payment_processor import PaymentProcessor
+
+
+# Приложение и клиент строятся один раз на сессию: маршруты и конфиг
+# не меняются между тестами, пересоздавать их перед каждым тестом незачем
+@pytest.fixture(scope="session")
+def app():
+    """Фикстура Flask приложения для тестирования"""
+    flask_app.config['TESTING'] = True
+    flask_app.config['WTF_CSRF_ENABLED'] = False
+    return flask_app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    """Фикстура тестового клиента Flask"""
+    return app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def _restore_app_services():
+    """Возврат оригинальных сервисов приложения после каждого теста
+
+    Страховка для тестов, подменяющих глобальные сервисы src.app:
+    даже если тест забыл восстановить подмену, соседи ее не увидят.
+    """
+    original_processor = src.app.payment_processor
+    original_gateway = src.app.payment_gateway
+    yield
+    src.app.payment_processor = original_processor
+    src.app.payment_gateway = original_gateway
+
+
+# Шаблоны autospec-моков сервисов: create_autospec интроспектирует класс
+# при каждом вызове, поэтому строим его один раз на сессию, а в тестах
+# отдаем дешевую копию со сброшенным состоянием
+@pytest.fixture(scope="session")
+def _gateway_mock_template():
+    return create_autospec(PaymentGateway, instance=True)
+
+
+@pytest.fixture(scope="session")
+def _email_mock_template():
+    return create_autospec(EmailService, instance=True)
+
+
+@pytest.fixture(scope="session")
+def _processor_mock_template():
+    return create_autospec(PaymentProcessor, instance=True)
+
+
+def _fresh_mock(template):
+    """Копия шаблона autospec-мока без накопленных вызовов и настроек"""
+    mock = copy.copy(template)
+    mock.reset_mock(return_value=True, side_effect=True)
+    return mock
+
+
+@pytest.fixture
+def mock_gateway(_gateway_mock_template):
+    """Фикстура мока платежного шлюза"""
+    gateway = _fresh_mock(_gateway_mock_template)
+    gateway.base_url = "https://api.payment-gateway.com"
+    gateway.api_key = "test_key_123"
+    return gateway
+
+
+@pytest.fixture
+def mock_email(_email_mock_template):
+    """Фикстура мока email сервиса"""
+    email = _fresh_mock(_email_mock_template)
+    email.smtp_server = "smtp.test.com"
+    return email
+
+
+@pytest.fixture
+def mock_processor(_processor_mock_template):
+    """Фикстура мока процессора платежей"""
+    return _fresh_mock(_processor_mock_template)
+
+
+@pytest.fixture
+def payment_processor(mock_gateway, mock_email):
+    """Фикстура PaymentProcessor с моками"""
+    return PaymentProcessor(mock_gateway, mock_email)
+
+
+@pytest.fixture
+def swap_attr():
+    """Прямая подмена атрибута модуля/объекта с восстановлением после теста
+
+    Дешевле, чем mocker.patch: без стека патчеров и инспекции кадров -
+    просто setattr туда и обратно.
+    """
+    saved = []
+
+    def _swap(obj, name, value):
+        saved.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+        return value
+
+    yield _swap
+    for obj, name, original in reversed(saved):
+        setattr(obj, name, original)
+
+
+@pytest.fixture
+def sample_payment_data():
+    """Фикстура с тестовыми данными платежа"""
+    return {
+        "amount": 1500.50,
+        "card_token": "tok_test_123456789",
+        "user_email": "customer@example.com",
+        "description": "Test payment"
+    }
+
+
+@pytest.fixture
+def successful_payment_response():
+    """Фикстура с успешным ответом платежного шлюза"""
+    return {
+        "status": "success",
+        "transaction_id": "txn_test_123456",
+        "message": "Payment processed successfully"
+    }
+
+
+@pytest.fixture
+def failed_payment_response():
+    """Фикстура с неудачным ответом платежного шлюза"""
+    return {
+        "status": "failed",
+        "transaction_id": "txn_test_654321",
+        "message": "Insufficient funds"
+    }
+
+
+@pytest.fixture
+def make_http_response():
+    """Фабрика стабов HTTP-ответа шлюза
+
+    SimpleNamespace с парой лямбд заметно дешевле Mock с настройкой
+    json.return_value и raise_for_status.return_value.
+    """
+    def _make(payload, status=200):
+        return types.SimpleNamespace(
+            json=lambda: payload,
+            raise_for_status=lambda: None,
+            status_code=status,
+        )
+    return _make
+
+
+# HTTP-методы сессии подменяются прямым setattr на классе Session через
+# swap_attr: тот же эффект, что patch('...Session.post'), но без
+# машинерии патчера
+@pytest.fixture
+def mock_requests_post(swap_attr):
+    """Фикстура для мока HTTP POST платежного шлюза"""
+    return swap_attr(requests.Session, 'post', Mock())
+
+
+@pytest.fixture
+def mock_requests_get(swap_attr):
+    """Фикстура для мока HTTP GET платежного шлюза"""
+    return swap_attr(requests.Session, 'get', Mock())
+
+
+@pytest.fixture
+def mock_smtp():
+    """Фикстура для мока smtplib.SMTP"""
+    with patch('src.services.email_service.smtplib.SMTP') as mock_smtp:
+        yield mock_smtp.return_value
\ No newline at end of file
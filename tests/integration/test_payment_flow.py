@@ -8,30 +8,34 @@ from src.services.payment_processor import PaymentProcessor
 class TestPaymentIntegration:
     """Тестирование взаимодействия реальных компонентов"""
 
-    @pytest.fixture
+    # Сервисы без состояния между тестами - строим один раз на модуль,
+    # а не перед каждым тестом
+    @pytest.fixture(scope="module")
     def gateway(self):
         # Используем тестовый API ключ
         return PaymentGateway(api_key="test_key_123")
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def email_service(self):
         return EmailService()
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def processor(self, gateway, email_service):
         return PaymentProcessor(gateway, email_service)
 
-    @patch('src.services.payment_gateway.requests.post')
-    def test_full_payment_flow_with_mocked_api(self, mock_post, processor):
+    @pytest.fixture(autouse=True)
+    def _clean_history(self, processor):
+        """Очистка истории транзакций между тестами общего процессора"""
+        yield
+        processor.clear_transactions()
+
+    def test_full_payment_flow_with_mocked_api(self, processor, mock_requests_post, make_http_response):
         """Полный поток с замоканным API"""
-        # Настройка мока для внешнего API
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        # Настройка стаба ответа внешнего API
+        mock_requests_post.return_value = make_http_response({
             "status": "success",
             "transaction_id": "txn_123"
-        }
-        mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
+        })
 
         # Выполнение платежа
         result = processor.make_payment(
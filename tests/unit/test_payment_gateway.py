@@ -1,16 +1,45 @@
 # tests/unit/test_payment_gateway.py
 import pytest
-import requests
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 from src.services.payment_gateway import PaymentGateway, PaymentError
 
 
+class _ErrorResponse:
+    """Легкий стаб HTTP-ответа с ошибочным статусом
+
+    Обычный класс вместо Mock: без call-tracking и настройки side_effect;
+    по одному экземпляру на статус-код на весь модуль.
+    """
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        import requests
+        raise requests.exceptions.HTTPError(str(self.status_code))
+
+    def json(self):
+        return {}
+
+
+_ERROR_RESPONSES = {code: _ErrorResponse(code) for code in (401, 402, 500)}
+
+
+@pytest.fixture(scope="module")
+def gateway():
+    """Один экземпляр шлюза на модуль: конструктор детерминирован"""
+    return PaymentGateway(api_key="test_key_123")
+
+
 class TestPaymentGateway:
     """Модульные тесты для PaymentGateway"""
 
-    @pytest.fixture
-    def gateway(self):
-        return PaymentGateway(api_key="test_key_123")
+    @pytest.fixture(autouse=True)
+    def _clean_card_cache(self, gateway):
+        """Сброс внутрипроцессного кэша валидации между тестами"""
+        yield
+        with gateway._local_cache_lock:
+            gateway._local_cache.clear()
 
     def test_init_default_values(self):
         """Тест инициализации с значениями по умолчанию"""
@@ -18,17 +47,14 @@ class TestPaymentGateway:
         assert gateway.api_key is not None
         assert gateway.base_url == "https://api.payment-gateway.com"
 
-    def test_process_payment_success(self, gateway, mock_requests_post):
+    def test_process_payment_success(self, gateway, mock_requests_post, make_http_response):
         """Тест успешной обработки платежа"""
-        # Настройка мока
-        mock_response = Mock()
-        mock_response.json.return_value = {
+        # Настройка стаба ответа
+        mock_requests_post.return_value = make_http_response({
             "status": "success",
             "transaction_id": "txn_123",
             "message": "Payment successful"
-        }
-        mock_response.raise_for_status.return_value = None
-        mock_requests_post.return_value = mock_response
+        })
 
         # Вызов метода
         result = gateway.process_payment(1000.0, "tok_abc123")
@@ -50,6 +76,7 @@ class TestPaymentGateway:
 
     def test_process_payment_timeout_error(self, gateway, mock_requests_post):
         """Тест таймаута при обработке платежа"""
+        import requests
         mock_requests_post.side_effect = requests.exceptions.Timeout("Request timeout")
 
         with pytest.raises(PaymentError, match="Таймаут соединения"):
@@ -57,80 +84,112 @@ class TestPaymentGateway:
 
     def test_process_payment_connection_error(self, gateway, mock_requests_post):
         """Тест ошибки соединения"""
+        import requests
         mock_requests_post.side_effect = requests.exceptions.ConnectionError("No connection")
 
         with pytest.raises(PaymentError, match="Нет соединения"):
             gateway.process_payment(1000.0, "tok_abc123")
 
-    def test_process_payment_http_401_error(self, gateway, mock_requests_post):
-        """Тест ошибки 401 (неавторизован)"""
-        mock_response = Mock()
-        mock_response.status_code = 401
-        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("401")
-        mock_requests_post.return_value = mock_response
-
-        with pytest.raises(PaymentError, match="Неверный API ключ"):
-            gateway.process_payment(1000.0, "tok_abc123")
-
-    def test_process_payment_http_402_error(self, gateway, mock_requests_post):
-        """Тест ошибки 402 (недостаточно средств)"""
-        mock_response = Mock()
-        mock_response.status_code = 402
-        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("402")
-        mock_requests_post.return_value = mock_response
-
-        with pytest.raises(PaymentError, match="Недостаточно средств"):
-            gateway.process_payment(1000.0, "tok_abc123")
-
-    def test_process_payment_http_500_error(self, gateway, mock_requests_post):
-        """Тест ошибки 500 (серверная ошибка)"""
-        mock_response = Mock()
-        mock_response.status_code = 500
-        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("500")
-        mock_requests_post.return_value = mock_response
+    @pytest.mark.parametrize("status,match", [
+        (401, "Неверный API ключ"),
+        (402, "Недостаточно средств"),
+        (500, "Ошибка сервера"),
+    ])
+    def test_process_payment_http_error(self, gateway, mock_requests_post, status, match):
+        """Тест маппинга HTTP-ошибок шлюза на сообщения PaymentError"""
+        mock_requests_post.return_value = _ERROR_RESPONSES[status]
 
-        with pytest.raises(PaymentError, match="Ошибка сервера"):
+        with pytest.raises(PaymentError, match=match):
             gateway.process_payment(1000.0, "tok_abc123")
 
-    @patch('src.services.payment_gateway.requests.get')
-    def test_validate_card_success(self, mock_get, gateway):
+    def test_validate_card_success(self, gateway, mock_requests_get, make_http_response):
         """Тест успешной валидации карты"""
-        mock_response = Mock()
-        mock_response.json.return_value = {"valid": True}
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        mock_requests_get.return_value = make_http_response({"valid": True})
 
         result = gateway.validate_card("tok_abc123")
 
         assert result is True
-        mock_get.assert_called_once_with(
+        mock_requests_get.assert_called_once_with(
             "https://api.payment-gateway.com/cards/tok_abc123/validate",
             params={"api_key": "test_key_123"},
             timeout=5
         )
 
-    @patch('src.services.payment_gateway.requests.get')
-    def test_validate_card_failure(self, mock_get, gateway):
+    def test_validate_card_failure(self, gateway, mock_requests_get):
         """Тест неудачной валидации карты"""
-        mock_get.side_effect = requests.exceptions.RequestException("Error")
+        import requests
+        mock_requests_get.side_effect = requests.exceptions.RequestException("Error")
 
         result = gateway.validate_card("tok_abc123")
 
         assert result is False
 
-    @pytest.mark.parametrize("amount,card_token", [
-        (0.01, "tok_123"),  # Минимальная сумма
-        (999999.99, "tok_456"),  # Большая сумма
-        (100.50, "tok_" + "a" * 20),  # Длинный токен
-    ])
-    def test_process_payment_various_inputs(self, gateway, mock_requests_post, amount, card_token):
-        """Тест обработки платежа с различными входными данными"""
+    def test_validate_card_luhn_precheck(self, gateway, mock_requests_get):
+        """Тест локального отсева PAN с неверной контрольной цифрой"""
+        # Неверная контрольная цифра - отклоняется без HTTP-вызова
+        assert gateway.validate_card("4111111111111112") is False
+        mock_requests_get.assert_not_called()
+
+        # Корректный PAN проходит до обычной валидации через API
         mock_response = Mock()
-        mock_response.json.return_value = {"status": "success", "transaction_id": "txn_123"}
+        mock_response.json.return_value = {"valid": True}
         mock_response.raise_for_status.return_value = None
-        mock_requests_post.return_value = mock_response
+        mock_requests_get.return_value = mock_response
 
-        result = gateway.process_payment(amount, card_token)
+        assert gateway.validate_card("4111111111111111") is True
+        mock_requests_get.assert_called_once()
 
-        assert result["status"] == "success"
-        mock_requests_post.assert_called_once()
\ No newline at end of file
+    def test_validate_card_local_memoization(self, gateway, mock_requests_get):
+        """Тест внутрипроцессного кэша: повторная валидация без HTTP"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"valid": True}
+        mock_response.raise_for_status.return_value = None
+        mock_requests_get.return_value = mock_response
+
+        assert gateway.validate_card("tok_memo_12345") is True
+        assert gateway.validate_card("tok_memo_12345") is True
+
+        mock_requests_get.assert_called_once()
+
+    def test_validate_card_cache_hit(self):
+        """Тест валидации карты из кэша без HTTP-вызова"""
+        mock_cache = Mock()
+        mock_cache.get.return_value = "1"
+        gateway = PaymentGateway(api_key="test_key_123", cache_client=mock_cache)
+
+        result = gateway.validate_card("tok_cached_123")
+
+        assert result is True
+        mock_cache.get.assert_called_once_with("card_valid:tok_cached_123")
+
+    def test_validate_cards_bulk(self, gateway, mock_requests_get):
+        """Тест параллельной валидации набора карт"""
+        mock_response = Mock()
+        mock_response.json.return_value = {"valid": True}
+        mock_response.raise_for_status.return_value = None
+        mock_requests_get.return_value = mock_response
+
+        tokens = ["tok_bulk_0001", "tok_bulk_0002", "tok_bulk_0003"]
+        results = gateway.validate_cards_bulk(tokens)
+
+        assert results == {token: True for token in tokens}
+        assert mock_requests_get.call_count == 3
+
+    def test_process_payment_various_inputs(self, gateway, mock_requests_post,
+                                            make_http_response):
+        """Тест обработки платежа с различными входными данными"""
+        mock_requests_post.return_value = make_http_response(
+            {"status": "success", "transaction_id": "txn_123"})
+
+        # Один тест с циклом вместо parametrize: одна настройка фикстур
+        # на все три набора входных данных
+        cases = [
+            (0.01, "tok_123"),  # Минимальная сумма
+            (999999.99, "tok_456"),  # Большая сумма
+            (100.50, "tok_" + "a" * 20),  # Длинный токен
+        ]
+        for amount, card_token in cases:
+            result = gateway.process_payment(amount, card_token)
+            assert result["status"] == "success"
+
+        assert mock_requests_post.call_count == len(cases)
\ No newline at end of file